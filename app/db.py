@@ -1,6 +1,7 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import NullPool
 
 DATABASE_URL = os.getenv("DATABASE_URL", "").strip()
 
@@ -9,10 +10,41 @@ if not DATABASE_URL:
     DATABASE_URL = "sqlite:///./local.db"
 
 connect_args = {}
+engine_kwargs = {}
 if DATABASE_URL.startswith("sqlite"):
     connect_args = {"check_same_thread": False}
-
-engine = create_engine(DATABASE_URL, connect_args=connect_args)
+else:
+    # Postgres: κρατάμε ζεστές συνδέσεις για τα threads του threadpool,
+    # και τις ανακυκλώνουμε πριν τις κόψει ο server (idle timeout)
+    engine_kwargs = {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "20")),
+        "pool_timeout": 30,
+        "pool_recycle": 1800,
+        # ένα φτηνό ping στο checkout: μια σύνδεση που έκλεισε ο server δεν φτάνει σε request
+        "pool_pre_ping": True,
+    }
+    # DB_NULLPOOL=1 -> πίσω από PgBouncer (transaction pooling) δεν κρατάμε δικό μας pool
+    if os.getenv("DB_NULLPOOL", "").strip() == "1":
+        engine_kwargs = {"poolclass": NullPool}
+
+engine = create_engine(
+    DATABASE_URL,
+    connect_args=connect_args,
+    query_cache_size=1200,  # compiled SQL cache (default 500)
+    **engine_kwargs,
+)
+
+if engine.dialect.name == "sqlite":
+
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, _record):
+        # WAL: readers don't block the writer; NORMAL is safe with WAL and avoids an fsync per commit
+        cur = dbapi_conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.execute("PRAGMA temp_store=MEMORY")
+        cur.close()
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -1,8 +1,21 @@
 import os
 import smtplib
+import threading
 from email.message import EmailMessage
+from typing import Optional
 
-def send_email_with_pdf(to_email: str, subject: str, body: str, pdf_bytes: bytes, filename: str = "jobcard.pdf"):
+# One logged-in SMTP connection, reused across emails: saves the TCP + STARTTLS + AUTH
+# handshake on every send. Checked with NOOP before use and recycled after
+# SMTP_MAX_MESSAGES, since providers cap messages per session.
+SMTP_MAX_MESSAGES = 100
+_smtp_lock = threading.Lock()
+_smtp: Optional[smtplib.SMTP] = None
+_smtp_key: Optional[tuple] = None
+_smtp_sent = 0
+
+
+def smtp_settings() -> dict:
+    """SMTP env vars; raises RuntimeError when they are not all set."""
     host = os.getenv("SMTP_HOST", "").strip()
     port = int(os.getenv("SMTP_PORT", "587"))
     user = os.getenv("SMTP_USER", "").strip()
@@ -11,15 +24,65 @@ def send_email_with_pdf(to_email: str, subject: str, body: str, pdf_bytes: bytes
 
     if not host or not user or not password or not sender:
         raise RuntimeError("SMTP is not configured (SMTP_HOST/SMTP_USER/SMTP_PASS/SMTP_FROM).")
+    return {"host": host, "port": port, "user": user, "password": password, "sender": sender}
+
+
+def _smtp_connection(cfg: dict) -> smtplib.SMTP:
+    """Live connection for cfg (call with _smtp_lock held)."""
+    global _smtp, _smtp_key, _smtp_sent
+    key = (cfg["host"], cfg["port"], cfg["user"])
+    if _smtp is not None and _smtp_key == key:
+        try:
+            if _smtp.noop()[0] == 250:
+                return _smtp
+        except (smtplib.SMTPException, OSError):
+            pass
+    _close_locked()
+    s = smtplib.SMTP(cfg["host"], cfg["port"], timeout=30)
+    try:
+        s.starttls()
+        s.login(cfg["user"], cfg["password"])
+    except Exception:
+        s.close()
+        raise
+    _smtp, _smtp_key, _smtp_sent = s, key, 0
+    return s
+
+
+def _close_locked():
+    global _smtp, _smtp_key
+    if _smtp is not None:
+        try:
+            _smtp.quit()
+        except Exception:
+            _smtp.close()
+    _smtp, _smtp_key = None, None
+
+
+def close_smtp():
+    """Log out of the shared SMTP connection (app shutdown)."""
+    with _smtp_lock:
+        _close_locked()
+
+
+def send_email_with_pdf(to_email: str, subject: str, body: str, pdf_bytes: bytes, filename: str = "jobcard.pdf"):
+    global _smtp_sent
+    cfg = smtp_settings()
 
     msg = EmailMessage()
-    msg["From"] = sender
+    msg["From"] = cfg["sender"]
     msg["To"] = to_email
     msg["Subject"] = subject
     msg.set_content(body)
     msg.add_attachment(pdf_bytes, maintype="application", subtype="pdf", filename=filename)
 
-    with smtplib.SMTP(host, port) as s:
-        s.starttls()
-        s.login(user, password)
-        s.send_message(msg)
+    with _smtp_lock:
+        try:
+            _smtp_connection(cfg).send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # dropped between the NOOP check and the send -> one retry on a fresh login
+            _close_locked()
+            _smtp_connection(cfg).send_message(msg)
+        _smtp_sent += 1
+        if _smtp_sent >= SMTP_MAX_MESSAGES:
+            _close_locked()
@@ -1,27 +1,43 @@
 import os
-import io
-import json
+import re
+import logging
+import functools
+import hashlib
+import tempfile
+import threading
+import multiprocessing
 import datetime as dt
-from typing import Optional, Dict, List
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Dict, List, Tuple
 
-from fastapi import FastAPI, Request, Depends, Form, UploadFile, File
+from fastapi import FastAPI, Request, Depends, Form, UploadFile, File, BackgroundTasks
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import (
+    Response,
     RedirectResponse,
     HTMLResponse,
     StreamingResponse,
-    JSONResponse,
+    ORJSONResponse,
     FileResponse,
 )
 from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool
+from jinja2 import FileSystemBytecodeCache
+import orjson
 
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, text, inspect as sa_inspect
+from sqlalchemy.orm import Session, joinedload, load_only, raiseload
+from sqlalchemy import and_, bindparam, func, or_, select, text, inspect as sa_inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 from .db import SessionLocal, engine, Base
 from .models import ChecklistItem, Visit, VisitChecklistLine, PartMemory
 from .pdf_utils import build_jobcard_pdf
-from .email_utils import send_email_with_pdf
+from .email_utils import close_smtp, send_email_with_pdf, smtp_settings
+
+log = logging.getLogger(__name__)
 
 
 # =========================
@@ -29,6 +45,15 @@ from .email_utils import send_email_with_pdf
 # =========================
 FIXED_RESET_CODE = os.getenv("RESET_CODE", "").strip() or "STE-2026"
 
+# DEBUG=1 -> templates are re-read from disk when they change (local development)
+DEBUG = os.getenv("DEBUG", "").strip() == "1"
+
+# AUTO_CREATE_TABLES=0 -> skip create_all/_ensure_schema at boot (schema already in place)
+AUTO_CREATE_TABLES = os.getenv("AUTO_CREATE_TABLES", "1").strip() == "1"
+
+# SEED_CHECKLIST=0 -> skip the default checklist check at boot (one less round trip on cold start)
+SEED_CHECKLIST = os.getenv("SEED_CHECKLIST", "1").strip() == "1"
+
 COMPANY = {
     "name": "O&S STEPHANOU LTD",
     "lines": [
@@ -45,7 +70,8 @@ COMPANY = {
 # =========================
 # APP (IMPORTANT: app must be defined BEFORE any @app.route)
 # =========================
-app = FastAPI()
+# dict returns (__dbinfo, __tables, ...) are serialised by orjson instead of stdlib json
+app = FastAPI(default_response_class=ORJSONResponse)
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # .../app
 STATIC_DIR = os.path.join(BASE_DIR, "static")          # .../app/static
@@ -54,6 +80,14 @@ app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 
 templates = Jinja2Templates(directory="app/templates")
 
+# Templates only change on deploy: skip the per-render mtime check and keep the
+# compiled templates on disk so a restarted worker doesn't parse them again.
+templates.env.auto_reload = DEBUG
+if not DEBUG:
+    JINJA_CACHE_DIR = os.path.join(tempfile.gettempdir(), "stefanos_jinja_cache")
+    os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+    templates.env.bytecode_cache = FileSystemBytecodeCache(JINJA_CACHE_DIR)
+
 
 # Serve service worker at ROOT scope (so it controls all pages)
 @app.get("/sw.js")
@@ -76,7 +110,7 @@ def get_db():
         db.close()
 
 
-DEFAULT_ITEMS = [
+DEFAULT_ITEMS = (
     ("ΒΑΣΙΚΑ ΣΤΟΙΧΕΙΑ ΟΧΗΜΑΤΟΣ", "Γενικο Σερβις"),
     ("ΒΑΣΙΚΑ ΣΤΟΙΧΕΙΑ ΟΧΗΜΑΤΟΣ", "Στοπερ μπροστα"),
     ("ΒΑΣΙΚΑ ΣΤΟΙΧΕΙΑ ΟΧΗΜΑΤΟΣ", "Στοπερ πισω"),
@@ -103,25 +137,170 @@ DEFAULT_ITEMS = [
     ("ΒΑΣΙΚΑ ΣΤΟΙΧΕΙΑ ΟΧΗΜΑΤΟΣ", "Μπιτε καθαριστηρων"),
     ("ΒΑΣΙΚΑ ΣΤΟΙΧΕΙΑ ΟΧΗΜΑΤΟΣ", "Κοντρα σουστες καπο μπροστα"),
     ("ΒΑΣΙΚΑ ΣΤΟΙΧΕΙΑ ΟΧΗΜΑΤΟΣ", "Κοντρα σουστες καπο πισω"),
-]
+)
 
 
 def _seed_checklist(db: Session):
-    if db.query(ChecklistItem).count() > 0:
+    # EXISTS stops at the first row; COUNT(*) would visit them all
+    if db.query(db.query(ChecklistItem.id).exists()).scalar():
         return
-    for cat, name in DEFAULT_ITEMS:
-        db.add(ChecklistItem(category=cat, name=name))
+    db.execute(ChecklistItem.__table__.insert(), [{"category": cat, "name": name} for cat, name in DEFAULT_ITEMS])
     db.commit()
+    _invalidate_checklist_items()
+
+
+# Columns searched with ILIKE '%q%' by index/search/history.
+SEARCH_COLUMNS = ("customer_name", "plate_number", "phone", "email", "model", "vin", "job_no")
+
+# Built once; callers bind the pattern with .params(q_pat=f"%{q}%"), so the
+# statement shape never changes and SQLAlchemy's compiled cache always hits.
+VISIT_TEXT_FILTER = or_(*(getattr(Visit, col).ilike(bindparam("q_pat")) for col in SEARCH_COLUMNS))
+
+# Columns the list pages (index/search/history) render; the rest (complaint, notes, ...)
+# is never fetched there, and touching it from a template raises instead of lazy-loading.
+VISIT_LIST_LOAD = load_only(
+    Visit.id, Visit.job_no, Visit.date_in, Visit.date_out,
+    Visit.plate_number, Visit.customer_name, Visit.phone,
+    raiseload=True,
+)
+
+
+_schema_ready = False
+
+
+def _ensure_schema():
+    """
+    create_all() only creates missing tables, so indexes added later
+    have to be created here for databases that already exist.
+    Runs once per process: after a successful run, later calls (lifespan re-entry
+    in tests) are no-ops.
+    """
+    global _schema_ready
+    if _schema_ready:
+        return
+    # part_memories / checklist_items may hold duplicates from before their unique
+    # indexes existed; keep the newest row of each key so the index can be built
+    # (visit lines copy category/name as text, nothing references checklist ids)
+    insp = sa_inspect(engine)
+    pm = PartMemory.__table__
+    if "uq_part_memory_key" not in {ix["name"] for ix in insp.get_indexes(pm.name)}:
+        keep = select(func.max(pm.c.id)).group_by(pm.c.model_key, pm.c.category, pm.c.item_name)
+        with engine.begin() as conn:
+            conn.execute(pm.delete().where(pm.c.id.not_in(keep)))
+
+    ci = ChecklistItem.__table__
+    if "uq_checklist_cat_name" not in {ix["name"] for ix in insp.get_indexes(ci.name)}:
+        keep = select(func.max(ci.c.id)).group_by(ci.c.category, ci.c.name)
+        with engine.begin() as conn:
+            conn.execute(ci.delete().where(ci.c.id.not_in(keep)))
+
+    ok = True
+    for table in Base.metadata.sorted_tables:
+        for idx in table.indexes:
+            try:
+                idx.create(bind=engine, checkfirst=True)
+            except Exception:
+                # e.g. a unique index over rows that already hold duplicates; the app still
+                # starts, but upserts relying on it (uq_part_memory_key) will fail
+                log.exception("could not create index %s", idx.name)
+                ok = False
+
+    # visit_id lookups use ix_vcl_visit_cat_id (leading column); the old single-column
+    # index on existing databases would only add a write to every line insert/save
+    vcl = VisitChecklistLine.__table__
+    vcl_indexes = {ix["name"] for ix in insp.get_indexes(vcl.name)}
+    if "ix_vcl_visit_cat_id" in vcl_indexes and "ix_visit_checklist_lines_visit_id" in vcl_indexes:
+        with engine.begin() as conn:
+            conn.execute(text("DROP INDEX ix_visit_checklist_lines_visit_id"))
+
+    if engine.dialect.name == "postgresql":
+        # pg_trgm lets Postgres use a GIN index for ILIKE '%q%'.
+        # Needs CREATE privilege on the database; without it search just stays a seq scan.
+        visits = Visit.__table__.name
+        try:
+            with engine.begin() as conn:
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                for col in SEARCH_COLUMNS:
+                    conn.execute(text(
+                        f'CREATE INDEX IF NOT EXISTS ix_visits_{col}_trgm ON "{visits}" USING gin ({col} gin_trgm_ops)'
+                    ))
+        except Exception:
+            log.warning("trigram search indexes not created", exc_info=True)
+            ok = False
+
+    # only a complete run is remembered; after a failure the next call tries again
+    _schema_ready = ok
 
 
 @app.on_event("startup")
 def on_startup():
-    Base.metadata.create_all(bind=engine)
-    db = SessionLocal()
-    try:
-        _seed_checklist(db)
-    finally:
-        db.close()
+    global _pdf_pool
+    if PDF_WORKERS > 0:
+        _pdf_pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    if AUTO_CREATE_TABLES:
+        Base.metadata.create_all(bind=engine)
+        _ensure_schema()
+    if SEED_CHECKLIST:
+        db = SessionLocal()
+        try:
+            _seed_checklist(db)
+        finally:
+            db.close()
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    if _pdf_pool is not None:
+        _pdf_pool.shutdown(wait=False, cancel_futures=True)
+    close_smtp()
+
+
+def _dialect_insert(table):
+    """INSERT construct of the current dialect (has on_conflict_do_nothing / do_update)."""
+    if engine.dialect.name == "postgresql":
+        return pg_insert(table)
+    return sqlite_insert(table)
+
+
+def _insert_ignore(table):
+    """INSERT ... ON CONFLICT DO NOTHING: rows that hit a unique index are skipped."""
+    return _dialect_insert(table).on_conflict_do_nothing()
+
+
+# =========================
+# CHECKLIST CACHE
+# =========================
+# The master checklist is read on every new visit and on /checklist but only
+# changes from the admin screens, so keep it in memory (per process) and drop it
+# whenever something writes to checklist_items.
+_items_lock = threading.Lock()
+_items_version = 0
+_items_cache: Optional[list] = None
+
+
+def _checklist_items(db: Session) -> list:
+    """(id, category, name) rows of the master checklist, ordered by id."""
+    global _items_cache
+    items = _items_cache
+    if items is not None:
+        return items
+    with _items_lock:
+        version = _items_version
+    items = db.execute(
+        select(ChecklistItem.id, ChecklistItem.category, ChecklistItem.name).order_by(ChecklistItem.id.asc())
+    ).all()
+    with _items_lock:
+        # don't store a list that was read before a concurrent write invalidated it
+        if version == _items_version:
+            _items_cache = items
+    return items
+
+
+def _invalidate_checklist_items():
+    global _items_cache, _items_version
+    with _items_lock:
+        _items_version += 1
+        _items_cache = None
 
 
 # =========================
@@ -139,27 +318,91 @@ def _parse_dt(date_s: str, time_s: str) -> Optional[dt.datetime]:
     if not time_s:
         time_s = "00:00"
     try:
-        y, m, d = [int(x) for x in date_s.split("-")]
-        hh, mm = [int(x) for x in time_s.split(":")]
-        return dt.datetime(y, m, d, hh, mm)
-    except Exception:
+        # <input type=date/time> values are ISO already: one C-level parse
+        return dt.datetime.fromisoformat(f"{date_s}T{time_s}")
+    except ValueError:
         return None
 
 
-def _selected_lines(lines: List[VisitChecklistLine]) -> List[VisitChecklistLine]:
-    out = []
-    for ln in lines:
-        if ln.exclude_from_print:
-            continue
-        res = (ln.result or "").upper().strip()
-        parts_code = (ln.parts_code or "").strip()
-        notes = (ln.notes or "").strip()
-        qty = int(ln.parts_qty or 0)
-        if res in ("CHECK", "REPAIR") or qty > 0 or parts_code or notes:
-            out.append(ln)
+def _parse_day(date_s: str) -> Optional[dt.datetime]:
+    """Midnight of an ISO date (history filters); None if empty/invalid."""
+    date_s = (date_s or "").strip()
+    if not date_s:
+        return None
+    try:
+        return dt.datetime.combine(dt.date.fromisoformat(date_s), dt.time())
+    except ValueError:
+        return None
+
+
+# result_12, notes_12, parts_code_12, parts_qty_12, exclude_12 -> ("result", "12") ...
+LINE_FIELD_RE = re.compile(r"^(result|notes|parts_code|parts_qty|exclude)_(\d+)$")
+
+VISIT_COLUMNS = frozenset(Visit.__table__.columns.keys())
+
+
+def _line_fields(form) -> Dict[int, Dict[str, str]]:
+    """Groups the per-line form fields by line id in a single pass over the form."""
+    out: Dict[int, Dict[str, str]] = {}
+    for key, value in form.multi_items():
+        m = LINE_FIELD_RE.match(key)
+        if m:
+            out.setdefault(int(m.group(2)), {})[m.group(1)] = value
     return out
 
 
+# what str.strip() removes (ASCII); plain TRIM(x) would only strip spaces
+WHITESPACE = " \t\r\n\v\f"
+
+
+def _sql_strip(col):
+    # trim(x, chars): same spelling on SQLite and Postgres
+    return func.trim(func.coalesce(col, ""), WHITESPACE)
+
+
+# SQL form of _selected_lines(): not excluded, and CHECK/REPAIR or any qty/parts code/notes
+SELECTED_LINE = and_(
+    VisitChecklistLine.exclude_from_print == False,  # noqa: E712
+    or_(
+        func.upper(_sql_strip(VisitChecklistLine.result)).in_(("CHECK", "REPAIR")),
+        func.coalesce(VisitChecklistLine.parts_qty, 0) > 0,
+        _sql_strip(VisitChecklistLine.parts_code) != "",
+        _sql_strip(VisitChecklistLine.notes) != "",
+    ),
+)
+
+
+def _visit_with_lines(db: Session, visit_id: int, selected: bool = False) -> Optional[Visit]:
+    """
+    Visit + its lines (ordered by category, id) in one round-trip (LEFT OUTER JOIN).
+    selected=True joins only the lines that go on the print/pdf (SELECTED_LINE), so
+    the filtering happens in the database.
+    Any other lazy load (e.g. from a template) raises instead of adding queries.
+    """
+    lines = Visit.lines.and_(SELECTED_LINE) if selected else Visit.lines
+    return (
+        db.query(Visit)
+        .options(joinedload(lines).raiseload("*"), raiseload("*"))
+        .filter(Visit.id == visit_id)
+        .one_or_none()
+    )
+
+
+def _selected_lines(lines: List[VisitChecklistLine]) -> List[VisitChecklistLine]:
+    # Python twin of SELECTED_LINE, for views that already hold every line (visit_view)
+    return [
+        ln
+        for ln in lines
+        if not ln.exclude_from_print
+        and (
+            (ln.result or "").upper().strip() in ("CHECK", "REPAIR")
+            or (ln.parts_qty or 0) > 0
+            or (ln.parts_code or "").strip()
+            or (ln.notes or "").strip()
+        )
+    ]
+
+
 def _visit_dict(v: Visit) -> dict:
     return {
         "id": v.id,
@@ -197,37 +440,84 @@ def __ping():
     return {"ok": True, "where": "app/main.py"}
 
 
+def _approx_counts(db: Session, tables: List[str]) -> Optional[Dict[str, int]]:
+    """
+    Postgres only: planner row estimates from pg_class (catalog lookup, no table scan).
+    None when not on Postgres or when a table has never been analyzed (reltuples = -1).
+    """
+    if engine.dialect.name != "postgresql":
+        return None
+    rows = db.execute(
+        text(
+            "SELECT c.relname, c.reltuples::bigint FROM pg_class c "
+            "JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE n.nspname = current_schema() AND c.relname IN :names"
+        ).bindparams(bindparam("names", expanding=True)),
+        {"names": list(tables)},
+    ).all()
+    counts = dict(rows)
+    if len(counts) != len(tables) or any(v < 0 for v in counts.values()):
+        return None
+    return counts
+
+
 @app.get("/__dbinfo")
-def __dbinfo(db: Session = Depends(get_db)):
+def __dbinfo(db: Session = Depends(get_db), exact: int = 0):
+    models = (
+        ("visits_count", Visit),
+        ("checklist_count", ChecklistItem),
+        ("part_memories_count", PartMemory),
+        ("lines_count", VisitChecklistLine),
+    )
+    approx = None if exact else _approx_counts(db, [m.__table__.name for _, m in models])
+    if approx is not None:
+        counts = {key: approx[m.__table__.name] for key, m in models}
+    else:
+        # all four counts as scalar subqueries of one SELECT -> one round-trip
+        counts = db.execute(
+            select(*(select(func.count()).select_from(m).scalar_subquery().label(key) for key, m in models))
+        ).one()._asdict()
     return {
         "driver": getattr(engine.url, "drivername", "unknown"),
         "database_url": str(engine.url),
-        "visits_count": db.query(Visit).count(),
-        "checklist_count": db.query(ChecklistItem).count(),
-        "part_memories_count": db.query(PartMemory).count(),
-        "lines_count": db.query(VisitChecklistLine).count(),
+        "approximate": approx is not None,
+        **counts,
     }
 
 
 @app.get("/__tables")
-def __tables(db: Session = Depends(get_db)):
+def __tables(db: Session = Depends(get_db), exact: int = 0):
     insp = sa_inspect(engine)
     tables = insp.get_table_names()
     out = {"tables": []}
+    if not tables:
+        return out
+
+    counts = None if exact else _approx_counts(db, tables)
+    if counts is not None:
+        out["approximate"] = True
+        for t in tables:
+            out["tables"].append({"table": t, "count": counts.get(t)})
+        return out
+
+    # one round-trip for all tables; names come from the inspector and are quoted by the dialect
+    quote = engine.dialect.identifier_preparer.quote
+    sql = " UNION ALL ".join(
+        f"SELECT CAST(:t{i} AS VARCHAR) AS name, COUNT(*) AS cnt FROM {quote(t)}" for i, t in enumerate(tables)
+    )
+    try:
+        counts = dict(db.execute(text(sql), {f"t{i}": t for i, t in enumerate(tables)}).all())
+    except Exception as e:
+        counts = {t: f"error: {e}" for t in tables}
+
     for t in tables:
-        try:
-            cnt = db.execute(text(f'SELECT COUNT(*) FROM "{t}"')).scalar()
-        except Exception:
-            try:
-                cnt = db.execute(text(f"SELECT COUNT(*) FROM {t}")).scalar()
-            except Exception as e:
-                cnt = f"error: {e}"
-        out["tables"].append({"table": t, "count": cnt})
+        out["tables"].append({"table": t, "count": counts.get(t)})
     return out
 
 
-@app.get("/__staticcheck")
-def __staticcheck():
+@functools.lru_cache(maxsize=1)
+def _static_inventory() -> dict:
+    # static/ is part of the deploy and doesn't change while the process runs
     app_js = os.path.join(STATIC_DIR, "app.js")
     sw_js = os.path.join(STATIC_DIR, "sw.js")
     manifest = os.path.join(STATIC_DIR, "manifest.webmanifest")
@@ -241,27 +531,37 @@ def __staticcheck():
     }
 
 
+@app.get("/__staticcheck")
+def __staticcheck():
+    return _static_inventory()
+
+
 # =========================
 # INDEX
 # =========================
+INDEX_PAGE_SIZE = 50
+
+
 @app.get("/", response_class=HTMLResponse)
-def index(request: Request, db: Session = Depends(get_db), q: str = ""):
-    visits_q = db.query(Visit)
+def index(request: Request, db: Session = Depends(get_db), q: str = "", page: int = 1):
+    page = max(page, 1)
+    visits_q = db.query(Visit).options(VISIT_LIST_LOAD)
     q = (q or "").strip()
     if q:
-        visits_q = visits_q.filter(
-            or_(
-                Visit.customer_name.ilike(f"%{q}%"),
-                Visit.plate_number.ilike(f"%{q}%"),
-                Visit.phone.ilike(f"%{q}%"),
-                Visit.email.ilike(f"%{q}%"),
-                Visit.model.ilike(f"%{q}%"),
-                Visit.vin.ilike(f"%{q}%"),
-                Visit.job_no.ilike(f"%{q}%"),
-            )
-        )
-    visits = visits_q.order_by(Visit.id.desc()).limit(200).all()
-    return templates.TemplateResponse("index.html", {"request": request, "visits": visits, "q": q})
+        visits_q = visits_q.filter(VISIT_TEXT_FILTER).params(q_pat=f"%{q}%")
+    # one extra row tells us whether there is a next page, without a COUNT(*)
+    visits = (
+        visits_q.order_by(Visit.id.desc())
+        .offset((page - 1) * INDEX_PAGE_SIZE)
+        .limit(INDEX_PAGE_SIZE + 1)
+        .all()
+    )
+    has_next = len(visits) > INDEX_PAGE_SIZE
+    visits = visits[:INDEX_PAGE_SIZE]
+    return templates.TemplateResponse(
+        "index.html",
+        {"request": request, "visits": visits, "q": q, "page": page, "has_next": has_next},
+    )
 
 
 # =========================
@@ -292,30 +592,35 @@ def visit_new(
         vin=(vin or "").strip() or None,
         date_in=None,
     )
-    if hasattr(v, "notes_general"):
+    if "notes_general" in VISIT_COLUMNS:
         v.notes_general = (notes or "").strip() or None
 
     db.add(v)
-    db.commit()
-    db.refresh(v)
-
-    items = db.query(ChecklistItem).order_by(ChecklistItem.id.asc()).all()
-    for it in items:
-        db.add(
-            VisitChecklistLine(
-                visit_id=v.id,
-                category=it.category,
-                item_name=it.name,
-                result="OK",
-                notes="",
-                parts_code="",
-                parts_qty=0,
-                exclude_from_print=False,
-            )
+    db.flush()  # assigns v.id; visit + lines are committed together below
+    visit_id = v.id  # read before commit expires v (avoids a refresh SELECT)
+
+    items = _checklist_items(db)
+    if items:
+        # one executemany INSERT for all lines, no ORM instances
+        db.execute(
+            VisitChecklistLine.__table__.insert(),
+            [
+                {
+                    "visit_id": visit_id,
+                    "category": it.category,
+                    "item_name": it.name,
+                    "result": "OK",
+                    "notes": "",
+                    "parts_code": "",
+                    "parts_qty": 0,
+                    "exclude_from_print": False,
+                }
+                for it in items
+            ],
         )
     db.commit()
 
-    return RedirectResponse(f"/visits/{v.id}", status_code=302)
+    return RedirectResponse(f"/visits/{visit_id}", status_code=302)
 
 
 # ✅ ADD LINE WITH "PERMANENT" CHECKBOX
@@ -334,20 +639,16 @@ def visit_add_line(
     if not new_category or not new_item:
         return RedirectResponse(f"/visits/{visit_id}", status_code=302)
 
-    visit = db.query(Visit).filter(Visit.id == visit_id).first()
+    visit = db.get(Visit, visit_id)
     if not visit:
         return RedirectResponse("/", status_code=302)
 
     # If permanent -> add to master checklist
     if is_permanent:
-        exists = (
-            db.query(ChecklistItem)
-            .filter(ChecklistItem.category == new_category, ChecklistItem.name == new_item)
-            .first()
-        )
-        if not exists:
-            db.add(ChecklistItem(category=new_category, name=new_item))
-            db.commit()
+        res = db.execute(_insert_ignore(ChecklistItem.__table__).values(category=new_category, name=new_item))
+        db.commit()
+        if res.rowcount:
+            _invalidate_checklist_items()
 
     # Always add to this visit if missing
     line_exists = (
@@ -379,39 +680,63 @@ def visit_add_line(
 
 @app.get("/visits/{visit_id}", response_class=HTMLResponse)
 def visit_view(visit_id: int, request: Request, db: Session = Depends(get_db), mode: str = "all"):
-    visit = db.query(Visit).filter(Visit.id == visit_id).first()
+    visit = _visit_with_lines(db, visit_id)
     if not visit:
         return RedirectResponse("/", status_code=302)
 
-    all_lines = (
-        db.query(VisitChecklistLine)
-        .filter(VisitChecklistLine.visit_id == visit_id)
-        .order_by(VisitChecklistLine.category.asc(), VisitChecklistLine.id.asc())
-        .all()
-    )
+    all_lines = visit.lines
 
+    # remembered part codes, only for this visit's lines that don't have one yet
+    # (the template falls back to mem only when ln.parts_code is empty)
     mem = {}
     mk = _model_key(visit)
     if mk:
-        rows = db.query(PartMemory).filter(PartMemory.model_key == mk).all()
-        for r in rows:
-            mem[(r.category, r.item_name)] = r.parts_code
+        mem = {
+            (r.category, r.item_name): r.parts_code
+            for r in db.execute(
+                select(PartMemory.category, PartMemory.item_name, PartMemory.parts_code)
+                .join(
+                    VisitChecklistLine,
+                    and_(
+                        VisitChecklistLine.visit_id == visit_id,
+                        func.coalesce(VisitChecklistLine.category, "") == PartMemory.category,
+                        func.coalesce(VisitChecklistLine.item_name, "") == PartMemory.item_name,
+                        func.coalesce(VisitChecklistLine.parts_code, "") == "",
+                    ),
+                )
+                .where(PartMemory.model_key == mk)
+            )
+        }
 
     lines_to_show = _selected_lines(all_lines) if mode == "selected" else all_lines
 
     return templates.TemplateResponse(
         "visit.html",
-        {"request": request, "visit": visit, "lines": lines_to_show, "all_lines": all_lines, "mode": mode, "mem": mem},
+        {
+            "request": request,
+            "visit": visit,
+            "lines": lines_to_show,
+            "all_lines": all_lines,
+            "mode": mode,
+            "mem": mem,
+            "email_failed": _email_failures.pop(visit_id, None),
+        },
     )
 
 
 @app.post("/visits/{visit_id}/save_all")
 async def visit_save_all(visit_id: int, request: Request, db: Session = Depends(get_db)):
-    visit = db.query(Visit).filter(Visit.id == visit_id).first()
+    # the line fields are dynamic (result_<id>, notes_<id>, ...) so the form is read here;
+    # the blocking DB work then runs in the threadpool, like the sync routes
+    form = await request.form()
+    return await run_in_threadpool(_save_visit_form, db, visit_id, form)
+
+
+def _save_visit_form(db: Session, visit_id: int, form) -> RedirectResponse:
+    visit = db.get(Visit, visit_id)
     if not visit:
         return RedirectResponse("/", status_code=302)
 
-    form = await request.form()
     mode = (form.get("mode") or "all").strip()
 
     visit.plate_number = (form.get("plate_number") or "").strip() or None
@@ -422,7 +747,7 @@ async def visit_save_all(visit_id: int, request: Request, db: Session = Depends(
     visit.model = (form.get("model") or "").strip() or None
     visit.km = (form.get("km") or "").strip() or None
     visit.customer_complaint = (form.get("customer_complaint") or "").strip() or None
-    if hasattr(visit, "notes_general"):
+    if "notes_general" in VISIT_COLUMNS:
         visit.notes_general = (form.get("notes_general") or "").strip() or None
 
     di = _parse_dt(form.get("date_in") or "", form.get("time_in") or "")
@@ -432,49 +757,74 @@ async def visit_save_all(visit_id: int, request: Request, db: Session = Depends(
     if do:
         visit.date_out = do
 
-    lines = db.query(VisitChecklistLine).filter(VisitChecklistLine.visit_id == visit_id).all()
+    # current values are read only to diff against the form; unchanged lines are not written
+    lines = db.execute(
+        select(
+            VisitChecklistLine.id,
+            VisitChecklistLine.category,
+            VisitChecklistLine.item_name,
+            VisitChecklistLine.result,
+            VisitChecklistLine.notes,
+            VisitChecklistLine.parts_code,
+            VisitChecklistLine.parts_qty,
+            VisitChecklistLine.exclude_from_print,
+        ).where(VisitChecklistLine.visit_id == visit_id)
+    ).all()
     mk = _model_key(visit)
 
+    fields = _line_fields(form)
+
+    updates = []
+    memories = {}  # (category, item_name) -> part_memories row; last line wins
+    now = dt.datetime.utcnow()
     for ln in lines:
-        rid = str(ln.id)
-        res = (form.get(f"result_{rid}") or "OK").strip().upper()
+        f = fields.get(ln.id, {})
+        res = (f.get("result") or "OK").strip().upper()
         if res not in ("OK", "CHECK", "REPAIR"):
             res = "OK"
-        ln.result = res
 
-        ln.notes = (form.get(f"notes_{rid}") or "").strip()
-        ln.parts_code = (form.get(f"parts_code_{rid}") or "").strip()
+        parts_code = (f.get("parts_code") or "").strip()
 
         try:
-            ln.parts_qty = int((form.get(f"parts_qty_{rid}") or "0").strip() or 0)
+            parts_qty = int((f.get("parts_qty") or "0").strip() or 0)
         except Exception:
-            ln.parts_qty = 0
-
-        ln.exclude_from_print = (form.get(f"exclude_{rid}") == "on")
-
-        if mk and ln.parts_code:
-            existing = (
-                db.query(PartMemory)
-                .filter(
-                    PartMemory.model_key == mk,
-                    PartMemory.category == (ln.category or ""),
-                    PartMemory.item_name == (ln.item_name or ""),
-                )
-                .first()
-            )
-            if existing:
-                existing.parts_code = ln.parts_code
-                existing.updated_at = dt.datetime.utcnow()
-            else:
-                db.add(
-                    PartMemory(
-                        model_key=mk,
-                        category=(ln.category or ""),
-                        item_name=(ln.item_name or ""),
-                        parts_code=ln.parts_code,
-                    )
-                )
-
+            parts_qty = 0
+
+        notes = (f.get("notes") or "").strip()
+        exclude = f.get("exclude") == "on"
+        if (res, notes, parts_code, parts_qty, exclude) != (
+            ln.result, ln.notes or "", ln.parts_code or "", ln.parts_qty or 0, bool(ln.exclude_from_print)
+        ):
+            updates.append({
+                "id": ln.id,
+                "result": res,
+                "notes": notes,
+                "parts_code": parts_code,
+                "parts_qty": parts_qty,
+                "exclude_from_print": exclude,
+            })
+
+        if mk and parts_code:
+            key = (ln.category or "", ln.item_name or "")
+            memories[key] = {
+                "model_key": mk,
+                "category": key[0],
+                "item_name": key[1],
+                "parts_code": parts_code,
+                "updated_at": now,
+            }
+
+    # one executemany UPDATE for the changed lines instead of a flush per dirty instance
+    if updates:
+        db.bulk_update_mappings(VisitChecklistLine, updates)
+
+    # remember the part codes for this model: a single INSERT ... ON CONFLICT DO UPDATE
+    if memories:
+        stmt = _dialect_insert(PartMemory.__table__).values(list(memories.values()))
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["model_key", "category", "item_name"],
+            set_={"parts_code": stmt.excluded.parts_code, "updated_at": stmt.excluded.updated_at},
+        ))
     db.commit()
     return RedirectResponse(f"/visits/{visit_id}?mode={mode}&saved=1", status_code=302)
 
@@ -482,46 +832,101 @@ async def visit_save_all(visit_id: int, request: Request, db: Session = Depends(
 # =========================
 # PDF / PRINT / EMAIL
 # =========================
+# Rendered job cards keyed by a hash of everything that goes on the page, so
+# re-opening / re-printing / e-mailing an unchanged visit skips ReportLab.
+PDF_CACHE_SIZE = 64
+
+# PDF_WORKERS=N -> render PDFs in N worker processes (ReportLab holds the GIL);
+# 0 (default) renders in the request thread, which is right for a single-CPU host.
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "0") or 0)
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+_pdf_lock = threading.Lock()
+_pdf_cache: "OrderedDict[str, bytes]" = OrderedDict()
+
+
+def _jobcard_data(visit: Visit, lines: List[VisitChecklistLine]) -> Tuple[str, tuple]:
+    """
+    (etag, build_jobcard_pdf args) for a visit and its selected lines.
+    The etag is a hash of everything drawn, including the footer date, so it can be
+    compared before anything is rendered.
+    """
+    # the footer carries the render day (not the time) so a cached PDF is never dated earlier
+    generated = dt.date.today().strftime("%d/%m/%Y")
+    visit_d = _visit_dict(visit)
+    lines_d = [_line_dict(x) for x in lines]
+    etag = hashlib.blake2b(orjson.dumps([visit_d, lines_d, generated]), digest_size=16).hexdigest()
+    return etag, (COMPANY, visit_d, lines_d, generated)
+
+
+def _jobcard_pdf(etag: str, args: tuple) -> bytes:
+    """PDF bytes for _jobcard_data(); LRU-cached per process by etag."""
+    with _pdf_lock:
+        pdf_bytes = _pdf_cache.get(etag)
+        if pdf_bytes is not None:
+            _pdf_cache.move_to_end(etag)
+            return pdf_bytes
+    if _pdf_pool is not None:
+        # plain dicts in, bytes out: runs on another core, this thread just waits
+        pdf_bytes = _pdf_pool.submit(build_jobcard_pdf, *args).result()
+    else:
+        pdf_bytes = build_jobcard_pdf(*args)
+    with _pdf_lock:
+        _pdf_cache[etag] = pdf_bytes
+        while len(_pdf_cache) > PDF_CACHE_SIZE:
+            _pdf_cache.popitem(last=False)
+    return pdf_bytes
+
+
 @app.get("/visits/{visit_id}/pdf")
-def visit_pdf(visit_id: int, db: Session = Depends(get_db)):
-    visit = db.query(Visit).filter(Visit.id == visit_id).first()
+def visit_pdf(visit_id: int, request: Request, db: Session = Depends(get_db)):
+    visit = _visit_with_lines(db, visit_id, selected=True)
     if not visit:
         return RedirectResponse("/", status_code=302)
 
-    lines = (
-        db.query(VisitChecklistLine)
-        .filter(VisitChecklistLine.visit_id == visit_id)
-        .order_by(VisitChecklistLine.category.asc(), VisitChecklistLine.id.asc())
-        .all()
-    )
-    selected = _selected_lines(lines)
+    selected = visit.lines
+
+    etag, args = _jobcard_data(visit, selected)
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "private, max-age=60"}
+    # checked before rendering: a 304 never costs a ReportLab run, even after a restart
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
 
-    pdf_bytes = build_jobcard_pdf(COMPANY, _visit_dict(visit), [_line_dict(x) for x in selected])
+    pdf_bytes = _jobcard_pdf(etag, args)
     filename = f"jobcard_{visit_id}.pdf"
-    return StreamingResponse(io.BytesIO(pdf_bytes), media_type="application/pdf", headers={
-        "Content-Disposition": f'inline; filename="{filename}"'
-    })
+    headers["Content-Disposition"] = f'inline; filename="{filename}"'
+    # the PDF is already one bytes object: send it as-is (with Content-Length) rather
+    # than copying it into a BytesIO and iterating that line by line
+    return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
 
 
 @app.get("/visits/{visit_id}/print", response_class=HTMLResponse)
 def visit_print(visit_id: int, request: Request, db: Session = Depends(get_db)):
-    visit = db.query(Visit).filter(Visit.id == visit_id).first()
+    visit = _visit_with_lines(db, visit_id, selected=True)
     if not visit:
         return RedirectResponse("/", status_code=302)
 
-    lines = (
-        db.query(VisitChecklistLine)
-        .filter(VisitChecklistLine.visit_id == visit_id)
-        .order_by(VisitChecklistLine.category.asc(), VisitChecklistLine.id.asc())
-        .all()
-    )
-    selected = _selected_lines(lines)
+    selected = visit.lines
     return templates.TemplateResponse("print.html", {"request": request, "visit": visit, "lines": selected})
 
 
+# visit_id -> recipient of the last background send that failed; shown (once) by visit_view
+_email_failures: Dict[int, str] = {}
+
+
+def _send_jobcard_email(visit_id: int, to_email: str, subject: str, body: str, pdf_bytes: bytes, filename: str):
+    # runs after the response has gone out: a failure is logged and kept for the visit page
+    try:
+        send_email_with_pdf(to_email, subject, body, pdf_bytes, filename=filename)
+    except Exception:
+        log.exception("sending %s to %s failed", filename, to_email)
+        _email_failures[visit_id] = to_email
+    else:
+        _email_failures.pop(visit_id, None)
+
+
 @app.post("/visits/{visit_id}/email")
-def visit_email(visit_id: int, db: Session = Depends(get_db)):
-    visit = db.query(Visit).filter(Visit.id == visit_id).first()
+def visit_email(visit_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    visit = _visit_with_lines(db, visit_id, selected=True)
     if not visit:
         return RedirectResponse("/", status_code=302)
 
@@ -529,23 +934,24 @@ def visit_email(visit_id: int, db: Session = Depends(get_db)):
     if not to_email:
         return RedirectResponse(f"/visits/{visit_id}?mode=all", status_code=302)
 
-    lines = (
-        db.query(VisitChecklistLine)
-        .filter(VisitChecklistLine.visit_id == visit_id)
-        .order_by(VisitChecklistLine.category.asc(), VisitChecklistLine.id.asc())
-        .all()
-    )
-    selected = _selected_lines(lines)
-    pdf_bytes = build_jobcard_pdf(COMPANY, _visit_dict(visit), [_line_dict(x) for x in selected])
+    # missing SMTP settings are still reported on the page right away
+    try:
+        smtp_settings()
+    except RuntimeError:
+        return RedirectResponse(f"/visits/{visit_id}?mode=all&email_error=1", status_code=302)
+
+    selected = visit.lines
+    pdf_bytes = _jobcard_pdf(*_jobcard_data(visit, selected))
 
     subject = f"Job Card {visit.job_no or visit.id}"
     body = "Σας επισυνάπτουμε το Job Card σε PDF.\n\nO&S STEPHANOU LTD"
-    try:
-        send_email_with_pdf(to_email, subject, body, pdf_bytes, filename=f"jobcard_{visit.id}.pdf")
-    except Exception:
-        return RedirectResponse(f"/visits/{visit_id}?mode=all&email_error=1", status_code=302)
+    # the SMTP handshake + upload happen after the redirect has been sent
+    background_tasks.add_task(
+        _send_jobcard_email, visit_id, to_email, subject, body, pdf_bytes, f"jobcard_{visit.id}.pdf"
+    )
 
-    return RedirectResponse(f"/visits/{visit_id}?mode=all&email_sent=1", status_code=302)
+    # queued, not yet delivered: a failed send shows up on the next load of the visit
+    return RedirectResponse(f"/visits/{visit_id}?mode=all&email_queued=1", status_code=302)
 
 
 # =========================
@@ -553,7 +959,7 @@ def visit_email(visit_id: int, db: Session = Depends(get_db)):
 # =========================
 @app.get("/checklist", response_class=HTMLResponse)
 def checklist_admin(request: Request, db: Session = Depends(get_db)):
-    items = db.query(ChecklistItem).order_by(ChecklistItem.category.asc(), ChecklistItem.id.asc()).all()
+    items = sorted(_checklist_items(db), key=lambda it: (it.category, it.id))
     return templates.TemplateResponse("checklist.html", {"request": request, "items": items})
 
 
@@ -562,29 +968,36 @@ def checklist_add(db: Session = Depends(get_db), category: str = Form(...), name
     category = category.strip()
     name = name.strip()
     if category and name:
-        exists = db.query(ChecklistItem).filter(ChecklistItem.category == category, ChecklistItem.name == name).first()
-        if not exists:
-            db.add(ChecklistItem(category=category, name=name))
-            db.commit()
+        res = db.execute(_insert_ignore(ChecklistItem.__table__).values(category=category, name=name))
+        db.commit()
+        if res.rowcount:
+            _invalidate_checklist_items()
     return RedirectResponse("/checklist", status_code=302)
 
 
 @app.post("/checklist/edit/{item_id}")
 def checklist_edit(item_id: int, db: Session = Depends(get_db), category: str = Form(...), name: str = Form(...)):
-    it = db.query(ChecklistItem).filter(ChecklistItem.id == item_id).first()
+    it = db.get(ChecklistItem, item_id)
     if it:
         it.category = (category or "").strip()
         it.name = (name or "").strip()
-        db.commit()
+        try:
+            db.commit()
+        except IntegrityError:
+            # renamed onto an existing (category, name) -> uq_checklist_cat_name
+            db.rollback()
+            return RedirectResponse("/checklist?edit_error=1", status_code=302)
+        _invalidate_checklist_items()
     return RedirectResponse("/checklist", status_code=302)
 
 
 @app.post("/checklist/delete/{item_id}")
 def checklist_delete(item_id: int, db: Session = Depends(get_db)):
-    it = db.query(ChecklistItem).filter(ChecklistItem.id == item_id).first()
+    it = db.get(ChecklistItem, item_id)
     if it:
         db.delete(it)
         db.commit()
+        _invalidate_checklist_items()
     return RedirectResponse("/checklist", status_code=302)
 
 
@@ -598,17 +1011,9 @@ def search_page(request: Request, q: str = "", db: Session = Depends(get_db)):
     if q:
         results = (
             db.query(Visit)
-            .filter(
-                or_(
-                    Visit.customer_name.ilike(f"%{q}%"),
-                    Visit.plate_number.ilike(f"%{q}%"),
-                    Visit.phone.ilike(f"%{q}%"),
-                    Visit.email.ilike(f"%{q}%"),
-                    Visit.model.ilike(f"%{q}%"),
-                    Visit.vin.ilike(f"%{q}%"),
-                    Visit.job_no.ilike(f"%{q}%"),
-                )
-            )
+            .options(VISIT_LIST_LOAD)
+            .filter(VISIT_TEXT_FILTER)
+            .params(q_pat=f"%{q}%")
             .order_by(Visit.id.desc())
             .limit(200)
             .all()
@@ -622,37 +1027,17 @@ def search_page(request: Request, q: str = "", db: Session = Depends(get_db)):
 @app.get("/history", response_class=HTMLResponse)
 def history_page(request: Request, db: Session = Depends(get_db), from_date: str = "", to_date: str = "", q: str = ""):
     q = (q or "").strip()
-    qy = db.query(Visit)
-
-    def _d(s: str) -> Optional[dt.datetime]:
-        s = (s or "").strip()
-        if not s:
-            return None
-        try:
-            y, m, d = [int(x) for x in s.split("-")]
-            return dt.datetime(y, m, d, 0, 0)
-        except Exception:
-            return None
+    qy = db.query(Visit).options(VISIT_LIST_LOAD)
 
-    d1 = _d(from_date)
-    d2 = _d(to_date)
+    d1 = _parse_day(from_date)
+    d2 = _parse_day(to_date)
     if d1:
         qy = qy.filter(Visit.date_in >= d1)
     if d2:
         qy = qy.filter(Visit.date_in < (d2 + dt.timedelta(days=1)))
 
     if q:
-        qy = qy.filter(
-            or_(
-                Visit.customer_name.ilike(f"%{q}%"),
-                Visit.plate_number.ilike(f"%{q}%"),
-                Visit.phone.ilike(f"%{q}%"),
-                Visit.email.ilike(f"%{q}%"),
-                Visit.model.ilike(f"%{q}%"),
-                Visit.vin.ilike(f"%{q}%"),
-                Visit.job_no.ilike(f"%{q}%"),
-            )
-        )
+        qy = qy.filter(VISIT_TEXT_FILTER).params(q_pat=f"%{q}%")
 
     visits = qy.order_by(Visit.id.desc()).limit(500).all()
     return templates.TemplateResponse(
@@ -661,27 +1046,207 @@ def history_page(request: Request, db: Session = Depends(get_db), from_date: str
     )
 
 
+# =========================
+# BACKUP / IMPORT
+# =========================
+BACKUP_BATCH = 1000
+
+# (json key, table, column names) in the order they appear in the backup file
+BACKUP_TABLES = tuple(
+    (key, table, tuple(table.columns.keys()))
+    for key, table in (
+        ("checklist_items", ChecklistItem.__table__),
+        ("part_memories", PartMemory.__table__),
+        ("visits", Visit.__table__),
+        ("visit_lines", VisitChecklistLine.__table__),
+    )
+)
+
+
+def _backup_stream():
+    """
+    Writes the backup JSON section by section, BACKUP_BATCH rows at a time,
+    so memory stays flat no matter how big the tables are.
+    Rows are plain Core tuples (no ORM instances / identity map), zipped
+    with the column names computed once in BACKUP_TABLES; orjson emits UTF-8
+    bytes and ISO datetimes directly.
+    Uses its own session: the body is produced after the handler has returned.
+    """
+    db = SessionLocal()
+    try:
+        head = {"version": 1, "exported_at": dt.datetime.utcnow().isoformat()}
+        yield orjson.dumps(head)[:-1]
+
+        for key, table, names in BACKUP_TABLES:
+            stmt = select(table).order_by(table.c.id.asc()).execution_options(yield_per=BACKUP_BATCH)
+            chunk = [f', "{key}": ['.encode("utf-8")]
+            sep = b""
+            for i, row in enumerate(db.execute(stmt), 1):
+                chunk.append(sep + orjson.dumps(dict(zip(names, row))))
+                sep = b", "
+                if i % BACKUP_BATCH == 0:
+                    yield b"".join(chunk)
+                    chunk = []
+            chunk.append(b"]")
+            yield b"".join(chunk)
+
+        yield b"}"
+    finally:
+        db.close()
+
+
+@app.get("/backup")
+def backup_export():
+    fname = f"stefanou_backup_{dt.datetime.now().strftime('%Y%m%d_%H%M')}.json"
+    return StreamingResponse(_backup_stream(), media_type="application/json", headers={
+        "Content-Disposition": f'attachment; filename="{fname}"'
+    })
+
+
+IMPORT_CHUNK = 1000
+
+
+def _insert_chunks(db: Session, table, rows: List[dict]):
+    """executemany INSERT in chunks of IMPORT_CHUNK rows (no ORM instances)."""
+    for i in range(0, len(rows), IMPORT_CHUNK):
+        db.execute(table.insert(), rows[i : i + IMPORT_CHUNK])
+
+
+@app.post("/backup/import")
+def backup_import(
+    db: Session = Depends(get_db),
+    file: UploadFile = File(...),
+    reset_password: str = Form(""),
+):
+    # Replaces ALL data (checklist + part memories too), so it needs the same code as /reset.
+    if (reset_password or "").strip() != FIXED_RESET_CODE:
+        return RedirectResponse("/?reset_error=1", status_code=302)
+
+    # sync route -> runs in the threadpool; the upload is already spooled to a temp file.
+    # The raw bytes are not kept in a local, so they are freed as soon as they are parsed.
+    try:
+        data = orjson.loads(file.file.read())
+    except orjson.JSONDecodeError:
+        return RedirectResponse("/?import_error=1", status_code=302)
+
+    # a missing table must not silently mean "empty it"
+    if not isinstance(data, dict) or any(not isinstance(data.get(key), list) for key, _, _ in BACKUP_TABLES):
+        return RedirectResponse("/?import_error=1", status_code=302)
+
+    # replace everything (safe for restore), all in one transaction:
+    # a failure anywhere rolls back to the data that was there before
+    try:
+        driver = (engine.url.drivername or "").lower()
+        tables = [
+            VisitChecklistLine.__table__,
+            Visit.__table__,
+            PartMemory.__table__,
+            ChecklistItem.__table__,
+        ]
+        if driver.startswith("postgresql"):
+            # one multi-table TRUNCATE: a single statement / lock round
+            quote = engine.dialect.identifier_preparer.quote
+            db.execute(text(f"TRUNCATE TABLE {', '.join(quote(t.name) for t in tables)} RESTART IDENTITY CASCADE"))
+        else:
+            for t in tables:
+                db.execute(t.delete())
+
+        seen = set()
+        item_rows = []
+        for it in data["checklist_items"]:
+            key = (it.get("category") or "", it.get("name") or "")
+            if key in seen:
+                continue
+            seen.add(key)
+            item_rows.append({"category": key[0], "name": key[1]})
+        _insert_chunks(db, ChecklistItem.__table__, item_rows)
+
+        # one row per (model_key, category, item_name) (uq_part_memory_key); later rows win
+        memories = {}
+        for pm in data["part_memories"]:
+            key = (pm.get("model_key") or "", pm.get("category") or "", pm.get("item_name") or "")
+            memories[key] = {
+                "model_key": key[0],
+                "category": key[1],
+                "item_name": key[2],
+                "parts_code": pm.get("parts_code") or "",
+                "updated_at": dt.datetime.fromisoformat(pm["updated_at"]) if pm.get("updated_at") else dt.datetime.utcnow(),
+            }
+        _insert_chunks(db, PartMemory.__table__, list(memories.values()))
+
+        backup_visits = data["visits"]
+        visit_rows = []
+        for v in backup_visits:
+            row = {
+                "job_no": v.get("job_no"),
+                "date_in": dt.datetime.fromisoformat(v["date_in"]) if v.get("date_in") else None,
+                "date_out": dt.datetime.fromisoformat(v["date_out"]) if v.get("date_out") else None,
+                "plate_number": v.get("plate_number"),
+                "vin": v.get("vin"),
+                "model": v.get("model"),
+                "km": v.get("km"),
+                "customer_name": v.get("customer_name"),
+                "phone": v.get("phone"),
+                "email": v.get("email"),
+                "customer_complaint": v.get("customer_complaint"),
+            }
+            if "notes_general" in VISIT_COLUMNS:
+                row["notes_general"] = v.get("notes_general")
+            visit_rows.append(row)
+
+        # executemany INSERT ... RETURNING id, ids come back in row order -> old id : new id
+        id_map = {}
+        if visit_rows:
+            visits = Visit.__table__
+            new_ids = db.execute(
+                visits.insert().returning(visits.c.id, sort_by_parameter_order=True), visit_rows
+            ).scalars().all()
+            id_map = {v.get("id"): new_id for v, new_id in zip(backup_visits, new_ids)}
+
+        _insert_chunks(db, VisitChecklistLine.__table__, [
+            {
+                "visit_id": id_map.get(ln.get("visit_id"), ln.get("visit_id")),
+                "category": ln.get("category"),
+                "item_name": ln.get("item_name"),
+                "result": ln.get("result") or "OK",
+                "notes": ln.get("notes"),
+                "parts_code": ln.get("parts_code"),
+                "parts_qty": int(ln.get("parts_qty") or 0),
+                "exclude_from_print": bool(ln.get("exclude_from_print") or False),
+            }
+            for ln in data["visit_lines"]
+        ])
+        db.commit()
+    except Exception:
+        log.exception("backup import failed")
+        db.rollback()
+        return RedirectResponse("/?import_error=1", status_code=302)
+    finally:
+        _invalidate_checklist_items()
+
+    return RedirectResponse("/?imported=1", status_code=302)
+
+
 # =========================
 # RESET
 # =========================
 @app.post("/reset")
-async def reset_tests(request: Request, db: Session = Depends(get_db)):
-    form = await request.form()
-    code = (form.get("reset_password") or "").strip()
+def reset_tests(db: Session = Depends(get_db), reset_password: str = Form("")):
+    code = (reset_password or "").strip()
     if code != FIXED_RESET_CODE:
         return RedirectResponse("/?reset_error=1", status_code=302)
 
     try:
         driver = (engine.url.drivername or "").lower()
-        visits_table = Visit.__table__.name
-        lines_table = VisitChecklistLine.__table__.name
 
         if driver.startswith("postgresql"):
-            db.execute(text(f'TRUNCATE TABLE "{lines_table}" RESTART IDENTITY CASCADE;'))
-            db.execute(text(f'TRUNCATE TABLE "{visits_table}" RESTART IDENTITY CASCADE;'))
+            quote = engine.dialect.identifier_preparer.quote
+            lines_table = quote(VisitChecklistLine.__table__.name)
+            visits_table = quote(Visit.__table__.name)
+            db.execute(text(f"TRUNCATE TABLE {lines_table}, {visits_table} RESTART IDENTITY CASCADE"))
         else:
-            db.query(VisitChecklistLine).delete(synchronize_session=False)
-            db.query(Visit).delete(synchronize_session=False)
+            db.execute(VisitChecklistLine.__table__.delete())
+            db.execute(Visit.__table__.delete())
 
         db.commit()
     except Exception:
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -7,6 +7,10 @@ from .db import Base
 
 class ChecklistItem(Base):
     __tablename__ = "checklist_items"
+    __table_args__ = (
+        # one master item per (category, name); lets inserts use ON CONFLICT DO NOTHING
+        Index("uq_checklist_cat_name", "category", "name", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     category = Column(String, index=True, nullable=False)
@@ -21,6 +25,10 @@ class PartMemory(Base):
     model_key="range rover", category="Φρένα", item_name="Στοπερ μπροστα" -> parts_code="1234"
     """
     __tablename__ = "part_memories"
+    __table_args__ = (
+        # one code per (model, item): lets visit saves upsert with ON CONFLICT
+        Index("uq_part_memory_key", "model_key", "category", "item_name", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     model_key = Column(String, index=True, nullable=False)
@@ -39,7 +47,7 @@ class Visit(Base):
 
     job_no = Column(String, nullable=True)
 
-    date_in = Column(DateTime, nullable=True)
+    date_in = Column(DateTime, nullable=True, index=True)
     date_out = Column(DateTime, nullable=True)
 
     plate_number = Column(String, nullable=True)
@@ -57,14 +65,24 @@ class Visit(Base):
     # Στο UI/handlers γίνεται χρήση του visit.notes_general, οπότε πρέπει να υπάρχει και στη βάση.
     notes_general = Column(Text, nullable=True)
 
-    lines = relationship("VisitChecklistLine", back_populates="visit", cascade="all, delete-orphan")
+    lines = relationship(
+        "VisitChecklistLine",
+        back_populates="visit",
+        cascade="all, delete-orphan",
+        order_by="(VisitChecklistLine.category, VisitChecklistLine.id)",
+    )
 
 
 class VisitChecklistLine(Base):
     __tablename__ = "visit_checklist_lines"
+    __table_args__ = (
+        # a visit's lines in display order (ORDER BY category, id) straight from the index
+        Index("ix_vcl_visit_cat_id", "visit_id", "category", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    visit_id = Column(Integer, ForeignKey("visits.id"), index=True, nullable=False)
+    # no index of its own: ix_vcl_visit_cat_id leads with visit_id
+    visit_id = Column(Integer, ForeignKey("visits.id"), nullable=False)
 
     category = Column(String, nullable=True)
     item_name = Column(String, nullable=True)
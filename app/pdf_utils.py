@@ -29,6 +29,8 @@ def _try_register_font():
 
 FONT = _try_register_font()
 
+PAGE_W, PAGE_H = A4
+
 
 def _fmt_dt(dt):
     if not dt:
@@ -41,15 +43,17 @@ def _fmt_dt(dt):
         return str(dt)
 
 
-def build_jobcard_pdf(company: dict, visit: dict, lines: list[dict]) -> bytes:
+def build_jobcard_pdf(company: dict, visit: dict, lines: list[dict], generated: str = "") -> bytes:
     """
     ✅ NO Paragraph/HTML parsing (so O&S never becomes O;S)
     ✅ Includes dates/times
     ✅ Includes only selected lines (caller already filters)
+    generated: footer text; callers that cache the PDF pass a value that is part of their key
     """
     buf = io.BytesIO()
-    c = canvas.Canvas(buf, pagesize=A4)
-    w, h = A4
+    # every new page (showPage) starts back on FONT 9 -> no setFont needed after page breaks
+    c = canvas.Canvas(buf, pagesize=A4, initialFontName=FONT, initialFontSize=9)
+    w, h = PAGE_W, PAGE_H
 
     c.setTitle("Job Card")
 
@@ -61,10 +65,12 @@ def build_jobcard_pdf(company: dict, visit: dict, lines: list[dict]) -> bytes:
     c.drawString(x, y, company.get("name", ""))
     y -= 18
 
-    c.setFont(FONT, 9)
-    for ln in company.get("lines", []):
-        c.drawString(x, y, ln)
-        y -= 12
+    # single-column blocks go through one text object (one BT/ET, relative moves)
+    t = c.beginText(x, y)
+    t.setFont(FONT, 9, leading=12)
+    t.textLines(company.get("lines", []))
+    c.drawText(t)
+    y = t.getY()
 
     y -= 10
     c.setLineWidth(0.8)
@@ -75,37 +81,42 @@ def build_jobcard_pdf(company: dict, visit: dict, lines: list[dict]) -> bytes:
     c.drawString(x, y, f"JOB: {visit.get('job_no', '')}")
     y -= 18
 
-    c.setFont(FONT, 10)
-    c.drawString(x, y, f"Αρ. Εγγραφής: {visit.get('plate_number','')}")
-    c.drawString(x + 260, y, f"VIN: {visit.get('vin','')}")
-    y -= 14
-    c.drawString(x, y, f"Μοντέλο: {visit.get('model','')}")
-    c.drawString(x + 260, y, f"KM: {visit.get('km','')}")
-    y -= 14
-    c.drawString(x, y, f"Όνομα: {visit.get('customer_name','')}")
-    y -= 14
-    c.drawString(x, y, f"Τηλέφωνο: {visit.get('phone','')}")
-    c.drawString(x + 260, y, f"Email: {visit.get('email','')}")
-    y -= 14
-
-    # ✅ Dates/times
-    c.drawString(x, y, f"Ημ/νία & Ώρα Άφιξης: {_fmt_dt(visit.get('date_in'))}")
-    y -= 14
-    c.drawString(x, y, f"Ημ/νία & Ώρα Παράδοσης: {_fmt_dt(visit.get('date_out'))}")
-    y -= 18
+    # vehicle / customer block: one text object per column, 14pt leading
+    left = c.beginText(x, y)
+    left.setFont(FONT, 10, leading=14)
+    left.textLines([
+        f"Αρ. Εγγραφής: {visit.get('plate_number','')}",
+        f"Μοντέλο: {visit.get('model','')}",
+        f"Όνομα: {visit.get('customer_name','')}",
+        f"Τηλέφωνο: {visit.get('phone','')}",
+        # ✅ Dates/times
+        f"Ημ/νία & Ώρα Άφιξης: {_fmt_dt(visit.get('date_in'))}",
+        f"Ημ/νία & Ώρα Παράδοσης: {_fmt_dt(visit.get('date_out'))}",
+    ])
+    right = c.beginText(x + 260, y)
+    right.setFont(FONT, 10, leading=14)
+    right.textLines([
+        f"VIN: {visit.get('vin','')}",
+        f"KM: {visit.get('km','')}",
+        "",
+        f"Email: {visit.get('email','')}",
+    ])
+    c.drawText(left)
+    c.drawText(right)
+    y = left.getY() - 4
 
     complaint = (visit.get("customer_complaint") or "").strip()
     if complaint:
         c.setFont(FONT, 10)
         c.drawString(x, y, "Απαίτηση / Σχόλια πελάτη:")
         y -= 14
-        c.setFont(FONT, 9)
         # wrap basic
         max_chars = 95
-        for i in range(0, len(complaint), max_chars):
-            c.drawString(x, y, complaint[i : i + max_chars])
-            y -= 12
-        y -= 8
+        t = c.beginText(x, y)
+        t.setFont(FONT, 9, leading=12)
+        t.textLines([complaint[i : i + max_chars] for i in range(0, len(complaint), max_chars)])
+        c.drawText(t)
+        y = t.getY() - 8
 
     c.setFont(FONT, 11)
     c.drawString(x, y, "ΕΠΙΛΕΓΜΕΝΕΣ ΕΡΓΑΣΙΕΣ (CHECK / REPAIR / PARTS)")
@@ -135,7 +146,6 @@ def build_jobcard_pdf(company: dict, visit: dict, lines: list[dict]) -> bytes:
 
         if y < 70:
             c.showPage()
-            c.setFont(FONT, 9)
             y = h - 60
 
         if cat and cat != last_cat:
@@ -160,7 +170,7 @@ def build_jobcard_pdf(company: dict, visit: dict, lines: list[dict]) -> bytes:
             y -= 12
 
     c.setFont(FONT, 8)
-    c.drawString(x, 40, f"Generated: {datetime.now().strftime('%d/%m/%Y %H:%M')}")
+    c.drawString(x, 40, f"Generated: {generated or datetime.now().strftime('%d/%m/%Y %H:%M')}")
 
     c.save()
     return buf.getvalue()
@@ -0,0 +1,22 @@
+import os
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# app.db builds its engine at import time -> point it at a throwaway sqlite file first
+_DB_DIR = tempfile.mkdtemp(prefix="stefanos_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}"
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    # templates are loaded from the relative "app/templates"
+    os.chdir(ROOT)
+    from app.main import app
+
+    with TestClient(app) as c:
+        yield c
@@ -0,0 +1,45 @@
+import re
+
+
+def _item_ids(client):
+    return [int(x) for x in re.findall(r'action="/checklist/delete/(\d+)"', client.get("/checklist").text)]
+
+
+def test_rename_onto_existing_item_is_rejected(client):
+    client.post("/checklist/add", data={"category": "TEST", "name": "A"})
+    client.post("/checklist/add", data={"category": "TEST", "name": "B"})
+    b_id = _item_ids(client)[-1]
+
+    r = client.post(f"/checklist/edit/{b_id}", data={"category": "TEST", "name": "A"}, follow_redirects=False)
+    assert r.status_code == 302
+    assert r.headers["location"] == "/checklist?edit_error=1"
+
+    page = client.get("/checklist?edit_error=1").text
+    assert "Υπάρχει ήδη item" in page
+    assert ">B<" in page or 'value="B"' in page
+
+    # the session is usable again after the rollback
+    r = client.post(f"/checklist/edit/{b_id}", data={"category": "TEST", "name": "C"}, follow_redirects=False)
+    assert r.headers["location"] == "/checklist"
+
+
+def test_ensure_schema_dedups_checklist_before_unique_index(client, monkeypatch):
+    from sqlalchemy import inspect, text
+
+    import app.main as main
+    from app.models import ChecklistItem
+
+    table = ChecklistItem.__table__
+    # a database from before uq_checklist_cat_name: duplicates allowed
+    with main.engine.begin() as conn:
+        conn.execute(text("DROP INDEX uq_checklist_cat_name"))
+        conn.execute(table.insert(), [{"category": "DUP", "name": "X"}] * 3)
+
+    monkeypatch.setattr(main, "_schema_ready", False)
+    main._ensure_schema()
+
+    assert main._schema_ready
+    assert "uq_checklist_cat_name" in {ix["name"] for ix in inspect(main.engine).get_indexes(table.name)}
+    with main.engine.connect() as conn:
+        rows = conn.execute(table.select().where(table.c.category == "DUP")).all()
+    assert len(rows) == 1
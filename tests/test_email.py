@@ -0,0 +1,41 @@
+import app.main as main
+
+
+def _new_visit(client):
+    r = client.post("/visits/new", data={"customer_name": "Mail", "email": "x@example.com"}, follow_redirects=False)
+    return int(r.headers["location"].rsplit("/", 1)[1])
+
+
+def _smtp_env(monkeypatch):
+    for key, value in {"SMTP_HOST": "smtp.invalid", "SMTP_USER": "u", "SMTP_PASS": "p"}.items():
+        monkeypatch.setenv(key, value)
+
+
+def test_failed_background_send_is_shown_on_the_visit(client, monkeypatch):
+    _smtp_env(monkeypatch)
+
+    def boom(*args, **kwargs):
+        raise OSError("connection refused")
+
+    monkeypatch.setattr(main, "send_email_with_pdf", boom)
+    vid = _new_visit(client)
+
+    r = client.post(f"/visits/{vid}/email", follow_redirects=False)
+    assert r.headers["location"] == f"/visits/{vid}?mode=all&email_queued=1"
+
+    page = client.get(r.headers["location"]).text
+    assert "email μπήκε σε αποστολή" in page
+    assert "απέτυχε" in page and "x@example.com" in page
+    # shown once
+    assert "απέτυχε" not in client.get(f"/visits/{vid}").text
+
+
+def test_successful_send_reports_no_failure(client, monkeypatch):
+    _smtp_env(monkeypatch)
+    sent = []
+    monkeypatch.setattr(main, "send_email_with_pdf", lambda *a, **k: sent.append(a[0]))
+    vid = _new_visit(client)
+
+    r = client.post(f"/visits/{vid}/email", follow_redirects=False)
+    assert sent == ["x@example.com"]
+    assert "απέτυχε" not in client.get(r.headers["location"]).text
@@ -0,0 +1,30 @@
+import app.main as main
+
+
+def test_conditional_pdf_request_skips_render(client, monkeypatch):
+    r = client.post("/visits/new", data={"customer_name": "Pdf"}, follow_redirects=False)
+    vid = int(r.headers["location"].rsplit("/", 1)[1])
+
+    renders = []
+    real = main.build_jobcard_pdf
+
+    def counting(*args):
+        renders.append(args)
+        return real(*args)
+
+    monkeypatch.setattr(main, "build_jobcard_pdf", counting)
+    main._pdf_cache.clear()
+
+    r = client.get(f"/visits/{vid}/pdf")
+    assert r.status_code == 200 and r.content[:4] == b"%PDF"
+    assert len(renders) == 1
+    etag = r.headers["etag"]
+
+    # cold cache (restart / eviction): a matching ETag still answers 304 without rendering
+    main._pdf_cache.clear()
+    r = client.get(f"/visits/{vid}/pdf", headers={"If-None-Match": etag})
+    assert r.status_code == 304
+    assert len(renders) == 1
+
+    # the footer date is passed in, so it is part of what the ETag hashes
+    assert renders[0][3] == main.dt.date.today().strftime("%d/%m/%Y")
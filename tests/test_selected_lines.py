@@ -0,0 +1,60 @@
+import pytest
+
+from app.db import SessionLocal
+from app.main import _selected_lines, _visit_with_lines
+from app.models import VisitChecklistLine
+
+
+@pytest.fixture
+def visit_id(client):
+    r = client.post("/visits/new", data={"customer_name": "Selected"}, follow_redirects=False)
+    return int(r.headers["location"].rsplit("/", 1)[1])
+
+
+# (notes, parts_code, result) per line; whitespace-only values are the interesting ones
+LINES = [
+    ("\n", "", "OK"),
+    ("", "\t", "OK"),
+    ("   ", "", "OK"),
+    ("", "  ", "OK"),
+    (" \n ", "", "OK"),
+    ("real note", "", "OK"),
+    ("", "", " repair "),
+    ("", "", "\tcheck\n"),
+    ("", "", "OK"),
+]
+
+
+def test_sql_and_python_selection_agree_on_whitespace(client, visit_id):
+    db = SessionLocal()
+    try:
+        lines = (
+            db.query(VisitChecklistLine)
+            .filter(VisitChecklistLine.visit_id == visit_id)
+            .order_by(VisitChecklistLine.id)
+            .limit(len(LINES))
+            .all()
+        )
+        for ln, (notes, code, result) in zip(lines, LINES):
+            ln.notes, ln.parts_code, ln.result = notes, code, result
+        db.commit()
+
+        in_sql = {ln.id for ln in _visit_with_lines(db, visit_id, selected=True).lines}
+        db.expunge_all()
+        in_python = {ln.id for ln in _selected_lines(_visit_with_lines(db, visit_id).lines)}
+    finally:
+        db.close()
+
+    assert in_sql == in_python
+    # whitespace-only notes/codes (tabs and newlines too) are not a selection
+    assert len(in_sql) == 3
+
+
+def test_visit_lines_have_no_separate_visit_id_index(client):
+    from sqlalchemy import inspect
+
+    from app.main import engine
+
+    names = {ix["name"] for ix in inspect(engine).get_indexes(VisitChecklistLine.__table__.name)}
+    assert "ix_vcl_visit_cat_id" in names
+    assert "ix_visit_checklist_lines_visit_id" not in names